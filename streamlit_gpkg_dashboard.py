@@ -7,16 +7,80 @@ added natural breaks & color palettes.
 import streamlit as st
 import geopandas as gpd
 import pandas as pd
-import fiona
+import pyogrio
 import io
 from streamlit_folium import st_folium
 import folium
-import matplotlib.pyplot as plt
+import folium.plugins
 import mapclassify
+import numpy as np
 from branca import colormap as cm
 import streamlit.components.v1 as components
+import concurrent.futures
+import hashlib
+import json
 import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import uuid
 import requests
+import shapely
+from shapely.geometry import box
+
+# Route all GeoPandas I/O through pyogrio (vectorized GDAL path) instead of
+# the per-feature Fiona reader.
+gpd.options.io_engine = "pyogrio"
+
+# Tune GDAL's /vsicurl/ range reader for the streaming fallback: bigger
+# chunks, a shared curl cache, and merged consecutive ranges mean only
+# the SQLite pages actually touched are fetched when reading a remote
+# GPKG directly.
+os.environ.setdefault("CPL_VSIL_CURL_CHUNK_SIZE", "1048576")
+os.environ.setdefault("CPL_VSIL_CURL_CACHE_SIZE", "67108864")
+os.environ.setdefault("GDAL_HTTP_MERGE_CONSECUTIVE_RANGES", "YES")
+os.environ.setdefault("VSI_CACHE", "TRUE")
+os.environ.setdefault("VSI_CACHE_SIZE", "100000000")
+# Stop GDAL probing the remote server for sidecar files (.gpkg-shm,
+# .aux.xml, …) that a HuggingFace dataset will never have — each probe
+# is an extra round-trip before the first real byte arrives.
+os.environ.setdefault(
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS", ".gpkg,.parquet,.fgb"
+)
+
+# Pragmas are per-connection in SQLite, so they must reach the
+# connection GDAL itself opens: mmap the file instead of pread-ing
+# pages, keep temp structures in memory, and give the page cache 256 MB
+# headroom for large layer scans.
+os.environ.setdefault(
+    "OGR_SQLITE_PRAGMA",
+    "mmap_size=268435456,temp_store=MEMORY,cache_size=-262144",
+)
+
+# Optional: parallel stats on very large layers. Everything still works
+# single-threaded when dask-geopandas is not installed.
+try:
+    import dask_geopandas
+except ImportError:
+    dask_geopandas = None
+
+LARGE_FRAME_ROWS = 200_000
+
+def _gdf_fingerprint(g):
+    """
+    O(1) cache fingerprint for GeoDataFrame arguments. Streamlit's
+    default pickle-hash walks the whole frame per call; hashing identity
+    alone breaks when an equal frame is re-created. Shape, columns and a
+    prefix of the first geometry's WKB are cheap and stable.
+    """
+    head = g.geometry.iloc[0].wkb[:32] if len(g) else b""
+    return (len(g), tuple(map(str, g.columns)), head)
+
+GDF_HASH = {gpd.GeoDataFrame: _gdf_fingerprint}
+
+# Background worker for prefetching downloads while the UI renders.
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=2)
 
 # -----------------------------------------------------------
 # CONFIG
@@ -52,31 +116,618 @@ GPKG_OPTIONS = {
 
 DEFAULT_LABEL = "2029 – 8% No Measures"
 
+BCR_URL = "https://huggingface.co/datasets/trategos/flood-gpkg-datasets/resolve/main/BCR.csv"
+
 # -----------------------------------------------------------
 # FUNCTIONS
 # -----------------------------------------------------------
-@st.cache_data(show_spinner=False)
+def _ranged_download(url: str, tmp: str, size: int, workers: int = 8,
+                     magic: bytes = None):
+    """
+    Fetch a file as `workers` concurrent byte-range requests, each
+    writing its slice into a pre-sized output. A single TCP flow rarely
+    fills the pipe on a 100 MB+ transfer; parallel ranges come close to
+    saturating it. When `magic` is given, the worker holding byte 0
+    validates the header from the bytes already in hand — no extra
+    open/read after the download.
+    """
+    with open(tmp, "wb") as f:
+        f.truncate(size)
+    step = -(-size // workers)
+
+    def grab(lo):
+        hi = min(lo + step, size) - 1
+        with requests.get(
+            url,
+            headers={
+                "Range": f"bytes={lo}-{hi}",
+                # SQLite pages barely compress and on-the-fly gzip
+                # breaks byte-range accounting; ask for raw bytes.
+                "Accept-Encoding": "identity",
+            },
+            stream=True,
+            timeout=60,
+        ) as r:
+            r.raise_for_status()
+            if r.status_code != 206:
+                # Server ignored the Range header and sent the whole
+                # body; writing it at this offset would corrupt the
+                # file. Bail out so the caller falls back.
+                raise IOError("range request not honoured")
+            check = magic if lo == 0 else None
+            with open(tmp, "r+b") as f:
+                f.seek(lo)
+                for chunk in r.iter_content(chunk_size=1024 * 1024):
+                    if check:
+                        if not chunk.startswith(check):
+                            raise IOError("unexpected file header")
+                        check = None
+                    f.write(chunk)
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as ex:
+        list(ex.map(grab, range(0, size, step)))
+
+def fetch_to_tempdir(url: str) -> str:
+    """
+    Plain download worker shared by local_copy and the background
+    prefetch — no Streamlit calls, safe to run off the main thread.
+    Writes to a unique .part file and renames atomically so concurrent
+    fetches of the same URL cannot corrupt each other. Large files are
+    pulled as parallel range requests when the server supports them.
+    """
+    if not url.lower().startswith(("http://", "https://")):
+        return url
+    # Keep the source extension so format branching (gpkg vs parquet vs
+    # fgb) still works on the cached copy.
+    ext = os.path.splitext(url.split("?")[0])[1] or ".gpkg"
+    dest = os.path.join(
+        tempfile.gettempdir(),
+        hashlib.md5(url.encode("utf-8")).hexdigest() + ext,
+    )
+    meta_path = dest + ".meta.json"
+
+    headers = {}
+    try:
+        headers = requests.head(url, allow_redirects=True, timeout=10).headers
+    except requests.RequestException:
+        # Offline or flaky network: serve whatever copy we have rather
+        # than failing the whole dashboard over a validation check.
+        if os.path.exists(dest):
+            return dest
+
+    if os.path.exists(dest):
+        # Revalidate instead of trusting the copy forever: one HEAD per
+        # session replaces a blind 100 MB redownload when the remote
+        # object changed, and costs nothing when it did not.
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        etag = headers.get("ETag")
+        modified = headers.get("Last-Modified")
+        if etag or modified:
+            if etag == meta.get("etag") and modified == meta.get("last_modified"):
+                return dest
+        else:
+            # Server exposes no validators; keep the cached copy.
+            return dest
+
+    tmp = dest + ".part-" + uuid.uuid4().hex
+    size = int(headers.get("Content-Length") or 0) or None
+    ranged = headers.get("Accept-Ranges", "").lower() == "bytes"
+    # Validate the header while the bytes stream past: an auth failure
+    # or error page saved under a .gpkg name would otherwise get cached
+    # and fed to GDAL.
+    magic = b"SQLite format 3" if ext == ".gpkg" else None
+
+    done = False
+    if ranged and size and size > 16 * 1024 * 1024:
+        try:
+            _ranged_download(url, tmp, size, magic=magic)
+            done = True
+        except Exception:
+            # Some servers advertise ranges they do not honour; fall
+            # through to the single-stream path.
+            pass
+    if not done:
+        with requests.get(
+            url, headers={"Accept-Encoding": "identity"}, stream=True
+        ) as r:
+            r.raise_for_status()
+            # copyfileobj loops in C and releases the GIL around the
+            # socket recv and file write, instead of one Python
+            # iteration per chunk.
+            r.raw.decode_content = True
+            with open(tmp, "wb") as f:
+                if magic:
+                    head = b""
+                    while len(head) < len(magic):
+                        piece = r.raw.read(len(magic) - len(head))
+                        if not piece:
+                            break
+                        head += piece
+                    if not head.startswith(magic):
+                        raise IOError(f"{url} is not a GeoPackage")
+                    f.write(head)
+                shutil.copyfileobj(r.raw, f, 1 << 20)
+    os.replace(tmp, dest)
+    try:
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "etag": headers.get("ETag"),
+                    "last_modified": headers.get("Last-Modified"),
+                },
+                f,
+            )
+    except OSError:
+        pass
+    return dest
+
+@st.cache_resource(show_spinner="Downloading GPKG…")
+def local_copy(url: str):
+    """
+    Download a remote GPKG once and reuse the local file on every rerun.
+
+    Reading straight from the URL makes GDAL re-negotiate HTTP range
+    requests on each slider tick; a one-off streamed download removes
+    that latency entirely. Local paths are passed through unchanged.
+    """
+    return fetch_to_tempdir(url)
+
+@st.cache_resource(show_spinner=False)
+def http_session():
+    """
+    One pooled requests.Session for the small auxiliary fetches
+    (metrics HTML, BCR CSV). Reusing the session keeps the TLS
+    connection to HuggingFace alive across calls instead of paying a
+    fresh handshake per request.
+    """
+    s = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+def _fetch_metrics_raw(session, url: str):
+    # Streamlit-free worker half of fetch_metrics, safe off-thread.
+    try:
+        r = session.get(url, timeout=10)
+        if r.status_code == 200:
+            return r.text
+    except requests.RequestException:
+        pass
+    return None
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def fetch_metrics(url: str):
+    """
+    Metrics HTML for a scenario, cached for an hour. Previously every
+    rerun re-downloaded the full page; now only the first request per
+    scenario (or per TTL window) touches the network, and when the
+    background prefetch already has the page in flight its future is
+    consumed instead of issuing a second request.
+    """
+    future = st.session_state.pop("metrics_future", None)
+    if future is not None and st.session_state.get("metrics_future_url") == url:
+        return future.result()
+    return _fetch_metrics_raw(http_session(), url)
+
+def _load_bcr_raw(session, url: str):
+    # Streamlit-free worker half of load_bcr, safe off-thread.
+    r = session.get(url, timeout=10)
+    r.raise_for_status()
+    df = pd.read_csv(io.StringIO(r.text), sep=";")
+    df["Benefit_num"] = pd.to_numeric(
+        df["Benefit"].astype("str").str.replace(r"[Rp.,\s]", "", regex=True),
+        errors="coerce",
+    )
+    # Normalized scenario key as the index: matching becomes a hash
+    # lookup instead of a regex scan over every row per rerun.
+    df.index = df["Skenario"].astype("str").str.lower().str.strip()
+    return df
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def load_bcr(url: str):
+    """
+    BCR table, downloaded and parsed once per TTL window. The rupiah
+    benefit column is converted to a numeric Benefit_num here with a
+    single compiled-regex pass over the whole column, instead of a
+    scalar parse on every rerun. Consumes the background-prefetch
+    future when one is in flight.
+    """
+    future = st.session_state.pop("bcr_future", None)
+    if future is not None:
+        return future.result()
+    return _load_bcr_raw(http_session(), url)
+
+@st.cache_resource(show_spinner=False, max_entries=32)
 def list_layers(path_or_url: str):
+    # GeoParquet holds a single table; no OGR inspection needed.
+    if path_or_url.endswith(".parquet"):
+        return [os.path.splitext(os.path.basename(path_or_url))[0]]
+    # A GPKG is plain SQLite: reading gpkg_contents directly skips the
+    # whole OGR open/inspect cycle.
+    if os.path.exists(path_or_url):
+        try:
+            # immutable+ro skips lock negotiation and change detection
+            # — nothing writes these files while the app is up.
+            con = sqlite3.connect(
+                f"file:{path_or_url}?immutable=1&mode=ro", uri=True
+            )
+            try:
+                rows = con.execute(
+                    "SELECT table_name FROM gpkg_contents "
+                    "WHERE data_type = 'features'"
+                ).fetchall()
+            finally:
+                con.close()
+            if rows:
+                return [r[0] for r in rows]
+        except sqlite3.Error:
+            pass
     try:
-        return fiona.listlayers(path_or_url)
+        return [name for name, _ in pyogrio.list_layers(path_or_url)]
     except Exception as e:
         st.warning(f"Could not list layers: {e}")
         return []
 
-@st.cache_data(show_spinner=True)
-def load_layer(path_or_url: str, layer_name: str = None):
+def shrink(gdf):
+    """
+    Downcast numeric columns and categoricalize low-cardinality strings.
+
+    GDAL hands back float64/int64/object columns; every downstream copy,
+    to_json() and describe() pays that width. Shrinking once at load time
+    roughly halves the memory the filter/serialize path has to touch.
+    """
+    for col in gdf.columns:
+        if col == gdf.geometry.name:
+            continue
+        s = gdf[col]
+        if pd.api.types.is_integer_dtype(s):
+            mn = s.min()
+            kind = "unsigned" if pd.notna(mn) and mn >= 0 else "integer"
+            gdf[col] = pd.to_numeric(s, downcast=kind)
+        elif pd.api.types.is_float_dtype(s):
+            gdf[col] = pd.to_numeric(s, downcast="float")
+        elif pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+            n = len(s)
+            if n and s.nunique(dropna=True) / n < 0.5:
+                gdf[col] = s.astype("category")
+    return gdf
+
+# cache_resource, not cache_data: cache_data pickle-hashes the returned
+# GeoDataFrame on every access, which on a large layer costs more than
+# the filtering it feeds. The frame is treated as a shared immutable
+# singleton — downstream code only ever slices it or adds columns to
+# slices, never mutates it in place.
+@st.cache_resource(show_spinner=True, max_entries=4)
+def load_layer(path_or_url: str, layer_name: str = None, columns: list = None):
     try:
-        return gpd.read_file(path_or_url, layer=layer_name)
+        # Columnar sources skip OGR entirely: Arrow zero-copies straight
+        # into pandas. FlatGeobuf (.fgb) still goes through read_file
+        # below but benefits from its built-in spatial index on bbox
+        # reads.
+        if path_or_url.endswith(".parquet"):
+            gdf = gpd.read_parquet(path_or_url, columns=columns)
+            gdf.sindex
+            return gdf
+
+        # GeoParquet sidecar: the first read of a (source, layer) pair
+        # persists the shrunk frame as Arrow-columnar parquet; later
+        # sessions mmap-load that instead of re-parsing SQLite WKB
+        # blobs. mtime/size go into the key so a re-downloaded or
+        # replaced file never serves a stale sidecar.
+        stamp = ""
+        if os.path.exists(path_or_url):
+            info = os.stat(path_or_url)
+            stamp = f"|{info.st_mtime_ns}|{info.st_size}"
+        sidecar = os.path.join(
+            tempfile.gettempdir(),
+            hashlib.md5(
+                f"{path_or_url}|{layer_name}{stamp}".encode("utf-8")
+            ).hexdigest() + ".parquet",
+        )
+        if columns is None and os.path.exists(sidecar):
+            gdf = gpd.read_parquet(sidecar)
+            gdf.sindex
+            return gdf
+
+        gdf = gpd.read_file(
+            path_or_url,
+            layer=layer_name,
+            columns=columns,
+            engine="pyogrio",
+            use_arrow=True,
+        )
+        gdf = shrink(gdf)
+        # Touch sindex so the R-tree is built once here and cached with
+        # the frame, instead of lazily on the first spatial query.
+        gdf.sindex
+        if columns is None:
+            try:
+                gdf.to_parquet(sidecar)
+            except Exception:
+                pass
+        return gdf
     except Exception as e:
         st.error(f"Failed to read file or layer: {e}")
         return None
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def fit_classifier_bins(values_hash: str, method: str, k: int, _values):
+    """
+    Fit a classifier once per (data, method, k) and return its bin edges.
+
+    Jenks in particular is O(N*k*iterations); caching on a cheap blake2b
+    hash of the value buffer means slider ticks that do not change the
+    classification inputs skip mapclassify entirely. `_values` carries
+    the data but is excluded from Streamlit's hashing.
+    """
+    data = np.asarray(_values, dtype=float)
+    data = data[~np.isnan(data)]
+    if method == "natural_breaks (Jenks)":
+        if len(data) > 5000:
+            # Fisher-Jenks is superlinear in N; breaks fitted on a fixed
+            # 5k sample land within a fraction of a class of the full
+            # fit, and the bins are applied to every row regardless.
+            data = np.random.default_rng(0).choice(data, 5000, replace=False)
+        return np.asarray(mapclassify.NaturalBreaks(data, k=k).bins, dtype=float)
+    # Quantile and equal-interval edges need no iterative fit at all:
+    # both are closed-form, so compute them directly in NumPy instead of
+    # going through mapclassify's Python classifier machinery.
+    if method == "quantiles":
+        return np.quantile(data, np.linspace(0, 1, k + 1))[1:]
+    return np.linspace(data.min(), data.max(), k + 1)[1:]
+
+@st.cache_resource(show_spinner=False, max_entries=16, hash_funcs=GDF_HASH)
+def filtered_geojson(gdf, columns: tuple, cache_key: tuple) -> dict:
+    """
+    GeoJSON-shaped dict for the map, built once per filter state.
+
+    Returning a dict instead of a to_json() string skips a full
+    encode/decode pair: folium parses string input back into dicts
+    before embedding anyway. Geometries are encoded by GEOS's GeoJSON
+    writer in one vectorized call — __geo_interface__ would instead
+    recurse through every ring in Python via shapely's mapping().
+    cache_resource shares the dict without pickling it per rerun; folium
+    only reads it. The frame is hashed by identity — cache_key (source,
+    layer, filter params, fields) is what decides reuse.
+    """
+    keep = [c for c in columns if c in gdf.columns]
+    geom_strs = shapely.to_geojson(gdf.geometry.values)
+    props = gdf[keep].to_dict(orient="records")
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": p, "geometry": json.loads(g)}
+            for p, g in zip(props, geom_strs)
+        ],
+    }
+
+@st.cache_resource(show_spinner=False, hash_funcs=GDF_HASH)
+def sorted_column(gdf, col: str, layer_key: tuple):
+    """
+    Sort a numeric column once per (layer, column); NaNs land at the
+    end. Range filters then become two binary searches plus a slice
+    instead of three O(N) boolean temporaries per slider tick.
+    """
+    vals = pd.to_numeric(gdf[col], errors="coerce").to_numpy(dtype=float)
+    order = np.argsort(vals, kind="stable").astype(np.int32)
+    return order, vals[order]
+
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs=GDF_HASH)
+def filtered_indices(gdf, layer_key: tuple, chosen_x: str, num_range, cat_sel):
+    """
+    Row positions matching the current filters, memoized on the filter
+    parameters. Identical parameter tuples (common while a user drags a
+    slider back and forth) skip the filtering entirely, and the int32
+    index array is far cheaper for the cache to store than a frame.
+    """
+    if num_range is not None:
+        order, sorted_vals = sorted_column(gdf, chosen_x, layer_key)
+        lo = np.searchsorted(sorted_vals, num_range[0], side="left")
+        hi = np.searchsorted(sorted_vals, num_range[1], side="right")
+        return np.sort(order[lo:hi])
+    if cat_sel:
+        s = gdf[chosen_x]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # Columns categoricalized at load time match on int codes:
+            # np.isin over small integers instead of string hashing.
+            sel_codes = s.cat.categories.get_indexer(list(cat_sel))
+            mask = np.isin(s.cat.codes.to_numpy(), sel_codes[sel_codes >= 0])
+            return np.flatnonzero(mask).astype(np.int32)
+        mask = s.isin(list(cat_sel))
+        return np.flatnonzero(mask.to_numpy()).astype(np.int32)
+    return np.arange(len(gdf), dtype=np.int32)
+
+@st.cache_resource(show_spinner=False, hash_funcs=GDF_HASH)
+def column_metadata(gdf, layer_key: tuple) -> dict:
+    """
+    Dtype/min/max/uniques for every attribute column, computed in one
+    pass per layer. All widgets read from this dict afterwards, so
+    switching the analysis column costs a dict lookup, not an O(N)
+    column scan. Uniques are omitted past 10k distinct values — a
+    multiselect that size is unusable anyway.
+    """
+    meta = {}
+    for c in gdf.columns:
+        if c == gdf.geometry.name:
+            continue
+        s = gdf[c]
+        if pd.api.types.is_numeric_dtype(s):
+            meta[c] = {
+                "is_numeric": True,
+                "min": float(s.min()),
+                "max": float(s.max()),
+                "uniques": None,
+            }
+        else:
+            uniques = None
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                # Columns categoricalized at load time already carry
+                # their deduplicated values; sorting the small category
+                # index skips the O(N) hash pass over the rows.
+                if len(s.cat.categories) < 10_000:
+                    uniques = sorted(s.cat.categories.tolist())
+            elif s.nunique(dropna=True) < 10_000:
+                uniques = sorted(s.dropna().unique().tolist())
+            meta[c] = {
+                "is_numeric": False, "min": None, "max": None,
+                "uniques": uniques,
+            }
+    return meta
+
+@st.cache_data(show_spinner=False, hash_funcs=GDF_HASH)
+def column_summaries(gdf, cols: tuple, cache_key: tuple):
+    """
+    Stats-panel summaries for the selected columns, cached per (filter
+    state, column set): a numeric describe() plus a bounded
+    unique/top/freq table for the rest (top/freq skipped past 1000
+    distinct values, where the value_counts hash pass dominates).
+    """
+    numeric_cols = [c for c in cols if pd.api.types.is_numeric_dtype(gdf[c])]
+    num_summary = None
+    if numeric_cols:
+        dask_frame = maybe_parallelize(gdf)
+        if dask_frame is not None:
+            num_summary = dask_frame[numeric_cols].describe().compute()
+        else:
+            num_summary = gdf[numeric_cols].describe()
+
+    cat_cols = [c for c in cols if c not in numeric_cols]
+    cat_summary = None
+    if cat_cols:
+        rows = []
+        for c in cat_cols:
+            n_unique = gdf[c].nunique(dropna=True)
+            if n_unique < 1000:
+                vc = gdf[c].value_counts()
+                top = vc.index[0] if len(vc) else None
+                freq = int(vc.iloc[0]) if len(vc) else 0
+            else:
+                top, freq = "(high cardinality, skipped)", None
+            rows.append(
+                {"column": c, "unique": n_unique, "top": top, "freq": freq}
+            )
+        cat_summary = pd.DataFrame(rows).set_index("column")
+    return num_summary, cat_summary
+
+@st.cache_data(show_spinner=False, hash_funcs=GDF_HASH)
+def histogram_counts(gdf, col: str, n_bins: int, cache_key: tuple):
+    """
+    30-odd bin counts for the histogram, cached per filter state — the
+    cache stores a tiny Series, so repeat reruns skip the O(N) binning.
+    """
+    vals = pd.to_numeric(gdf[col], errors="coerce").dropna().to_numpy()
+    if not len(vals):
+        return None
+    counts, bin_edges = np.histogram(vals, bins=n_bins)
+    centers = (bin_edges[:-1] + bin_edges[1:]) / 2
+    return pd.Series(counts, index=np.round(centers, 4))
+
+@st.cache_data(show_spinner=False, hash_funcs=GDF_HASH)
+def download_bytes(gdf, fmt: str, cache_key: tuple) -> bytes:
+    """
+    Serialize the download payload once per (filter state, format).
+
+    Same caching contract as filtered_geojson: the frame is hashed by
+    identity and cache_key decides reuse, so toggling unrelated widgets
+    no longer re-serializes the full filtered frame.
+    """
+    buffer = io.BytesIO()
+    if fmt == "GeoParquet":
+        gdf.to_parquet(buffer)
+    elif fmt == "FlatGeobuf":
+        pyogrio.write_dataframe(gdf, buffer, driver="FlatGeobuf")
+    else:
+        pyogrio.write_dataframe(gdf, buffer, driver="GeoJSON")
+    return buffer.getvalue()
+
+def maybe_parallelize(gdf):
+    """
+    Wrap very large frames in a dask-geopandas collection (one partition
+    per core) so O(N·M) reductions like describe() use all cores.
+    Returns None when dask-geopandas is missing or the frame is small
+    enough that partitioning overhead would dominate.
+    """
+    if dask_geopandas is None or len(gdf) <= LARGE_FRAME_ROWS:
+        return None
+    return dask_geopandas.from_geopandas(
+        gdf, npartitions=os.cpu_count() or 1
+    )
+
+def simplify_geoms(geoms, tolerance):
+    """
+    Douglas-Peucker over a geometry array, chunked across a thread pool
+    on large inputs. GEOS releases the GIL, so threads scale across
+    cores without the pickling a process pool would pay per geometry;
+    below the threshold a single vectorized call wins.
+    """
+    arr = geoms.to_numpy()
+    if len(arr) <= 50_000:
+        return shapely.simplify(arr, tolerance, preserve_topology=True)
+    workers = os.cpu_count() or 1
+    with concurrent.futures.ThreadPoolExecutor(workers) as ex:
+        parts = list(ex.map(
+            lambda chunk: shapely.simplify(
+                chunk, tolerance, preserve_topology=True
+            ),
+            np.array_split(arr, workers),
+        ))
+    return np.concatenate(parts)
+
+def cap_vertices(geoms, max_vertices, start_tol=1e-4):
+    """
+    Bound the vertex count of every geometry for display.
+
+    A tolerance slider alone leaves a long tail of polygons with
+    thousands of vertices, and that tail is what actually stalls the
+    browser. Offenders are re-simplified with an escalating tolerance
+    until they fit the budget; geometries already under it stay
+    untouched. An error-heap Douglas-Peucker would hit the budget
+    exactly but needs a compiled per-vertex loop — escalating the
+    tolerance gives the same payload bound using only vectorized GEOS
+    calls over the offending subset.
+    """
+    arr = geoms.to_numpy().copy()
+    tol = start_tol
+    for _ in range(8):
+        over = shapely.get_num_coordinates(arr) > max_vertices
+        if not over.any():
+            break
+        arr[over] = shapely.simplify(arr[over], tol, preserve_topology=True)
+        tol *= 4
+    return arr
+
+def popup_html_column(gdf, fields):
+    """
+    Build popup HTML for all rows in one pandas pass per field.
+
+    str.cat concatenates whole columns in C; the per-row alternative
+    (an f-string loop over fields for each feature) is O(N·fields) in
+    Python and shows up once layers reach tens of thousands of rows.
+    """
+    html = pd.Series("", index=gdf.index, dtype="str")
+    for i, f in enumerate(fields):
+        part = "<b>" + f + "</b>: " + gdf[f].astype("str").fillna("")
+        html = part if i == 0 else html.str.cat(part, sep="<br/>")
+    return html
+
 def safe_to_crs(gdf, crs="EPSG:4326"):
     try:
+        # Most layers already ship in the target CRS; skip the pyproj
+        # round-trip (which still copies every coordinate even for a
+        # no-op transform) when nothing would change.
+        if gdf.crs is not None and gdf.crs == crs:
+            return gdf
         return gdf.to_crs(crs)
     except Exception:
         return gdf
 
+_SCENARIO_RE = re.compile(r"^Impacts_aggregated_|_DESA\.gpkg$")
+
 def extract_scenario_name(gpkg_url: str):
     """
     Convert GPKG filename into scenario name.
@@ -84,9 +735,11 @@ def extract_scenario_name(gpkg_url: str):
         Impacts_aggregated_Current_2029_5percent_NBS_easternrivers_DESA.gpkg
     →   Current_2029_5percent_NBS_easternrivers
     """
-    fn = os.path.basename(gpkg_url)
-    fn = fn.replace("Impacts_aggregated_", "").replace("_DESA.gpkg", "")
-    return fn
+    return _SCENARIO_RE.sub("", os.path.basename(gpkg_url))
+
+# The six bundled scenarios never change within a session; resolving
+# their names once at import keeps the per-rerun path to a dict lookup.
+SCENARIO_KEYS = {u: extract_scenario_name(u) for u in GPKG_OPTIONS.values()}
 
 # -----------------------------------------------------------
 # SIDEBAR – DATA SOURCE
@@ -101,19 +754,66 @@ if mode == "Choose from list":
     selected_label = st.sidebar.selectbox("Select dataset", labels, index=default_index)
     gpkg_path = GPKG_OPTIONS[selected_label]
 else:
-    gpkg_path = st.sidebar.text_input("Enter remote GPKG URL", "")
+    gpkg_path = st.sidebar.text_input(
+        "Enter remote GPKG / GeoParquet / FlatGeobuf URL", ""
+    )
 
 if not gpkg_path:
     st.stop()
 
+# Kick off the download immediately so bytes stream in the background
+# while the title and sidebar below are being constructed; the future is
+# only awaited at the point the file is actually needed.
+if (
+    gpkg_path.lower().startswith(("http://", "https://"))
+    and st.session_state.get("gpkg_future_url") != gpkg_path
+):
+    st.session_state["gpkg_future"] = _EXECUTOR.submit(fetch_to_tempdir, gpkg_path)
+    st.session_state["gpkg_future_url"] = gpkg_path
+
+# The auxiliary fetches (metrics HTML, BCR CSV) are independent of the
+# GPKG download, so fire them here too and let them fly while the layer
+# loads below; fetch_metrics/load_bcr consume the futures at first use.
+scenario = SCENARIO_KEYS.get(gpkg_path) or extract_scenario_name(gpkg_path)
+metrics_filename = f"{scenario}_metrics.html"
+hf_url = (
+    "https://huggingface.co/datasets/trategos/flood-gpkg-datasets/resolve/main/"
+    + metrics_filename
+)
+if st.session_state.get("metrics_future_url") != hf_url:
+    st.session_state["metrics_future"] = _EXECUTOR.submit(
+        _fetch_metrics_raw, http_session(), hf_url
+    )
+    st.session_state["metrics_future_url"] = hf_url
+if "bcr_future" not in st.session_state:
+    st.session_state["bcr_future"] = _EXECUTOR.submit(
+        _load_bcr_raw, http_session(), BCR_URL
+    )
+
 # -----------------------------------------------------------
 # LOAD LAYERS
 # -----------------------------------------------------------
 st.sidebar.markdown("---")
 st.sidebar.write("### Layer selection")
+st.title("Amreta Naya Interactive Dashboard")
+
+# Work against a cached local copy; keep gpkg_path (the URL) for
+# scenario-name extraction further down. If the download fails (e.g.
+# disk-constrained deployments), fall back to streaming the remote file
+# through GDAL's tuned /vsicurl/ range reader instead of giving up.
+try:
+    future = st.session_state.get("gpkg_future")
+    if future is not None and st.session_state.get("gpkg_future_url") == gpkg_path:
+        with st.spinner("Downloading GPKG…"):
+            gpkg_src = future.result()
+    else:
+        gpkg_src = local_copy(gpkg_path)
+except Exception as e:
+    st.warning(f"Could not cache GPKG locally, streaming instead: {e}")
+    gpkg_src = "/vsicurl/" + gpkg_path
 
 with st.spinner("Listing layers..."):
-    layers = list_layers(gpkg_path)
+    layers = list_layers(gpkg_src)
 
 if layers:
     chosen_layer = st.sidebar.selectbox("Choose layer", layers)
@@ -124,10 +824,8 @@ else:
 # -----------------------------------------------------------
 # LOAD SELECTED LAYER
 # -----------------------------------------------------------
-st.title("Amreta Naya Interactive Dashboard")
-
 with st.spinner("Loading selected layer…"):
-    gdf = load_layer(gpkg_path, chosen_layer)
+    gdf = load_layer(gpkg_src, chosen_layer)
 
 if gdf is None:
     st.stop()
@@ -137,14 +835,9 @@ gdf = safe_to_crs(gdf)
 # -----------------------------------------------------------
 # LOAD METRICS HTML (LOCAL FIRST, HF FALLBACK)
 # -----------------------------------------------------------
-scenario = extract_scenario_name(gpkg_path)
-metrics_filename = f"{scenario}_metrics.html"
-
+# scenario / metrics_filename / hf_url are resolved up top so the
+# background prefetch could start before the layer load.
 local_path = f"/mnt/data/{metrics_filename}"
-hf_url = (
-    "https://huggingface.co/datasets/trategos/flood-gpkg-datasets/resolve/main/"
-    + metrics_filename
-)
 
 st.markdown("## Flood Risk Information")
 
@@ -155,14 +848,9 @@ if os.path.exists(local_path):
     with open(local_path, "r", encoding="utf-8") as f:
         html_content = f.read()
 
-# 2️⃣ Try HuggingFace fallback
+# 2️⃣ Try HuggingFace fallback (cached, pooled connection)
 else:
-    try:
-        r = requests.get(hf_url)
-        if r.status_code == 200:
-            html_content = r.text
-    except:
-        pass
+    html_content = fetch_metrics(hf_url)
 
 # 3️⃣ Show HTML (bigger box to prevent map layout issues)
 
@@ -188,21 +876,26 @@ columns = list(gdf.columns)
 columns_no_geom = [c for c in columns if c != gdf.geometry.name]
 
 chosen_x = st.sidebar.selectbox("Column for choropleth & analysis", columns_no_geom)
-is_numeric = pd.api.types.is_numeric_dtype(gdf[chosen_x])
 
-filtered = gdf.copy()
+stats = column_metadata(gdf, (gpkg_path, chosen_layer))[chosen_x]
+is_numeric = stats["is_numeric"]
+
 st.sidebar.write("### Filters")
 
+layer_key = (gpkg_path, chosen_layer)
+
 if is_numeric:
-    minv = float(gdf[chosen_x].min())
-    maxv = float(gdf[chosen_x].max())
+    minv, maxv = stats["min"], stats["max"]
     rmin, rmax = st.sidebar.slider(f"Filter {chosen_x}", minv, maxv, (minv, maxv))
-    filtered = filtered[(filtered[chosen_x] >= rmin) & (filtered[chosen_x] <= rmax)]
+    idx = filtered_indices(gdf, layer_key, chosen_x, (rmin, rmax), None)
+    filter_key = (chosen_x, rmin, rmax)
 else:
-    unique_vals = sorted(filtered[chosen_x].dropna().unique().tolist())
+    unique_vals = stats["uniques"] or []
     sel = st.sidebar.multiselect(f"Select values in {chosen_x}", unique_vals)
-    if sel:
-        filtered = filtered[filtered[chosen_x].isin(sel)]
+    idx = filtered_indices(gdf, layer_key, chosen_x, None, tuple(sel))
+    filter_key = (chosen_x, tuple(sel))
+
+filtered = gdf.iloc[idx]
 # -----------------------------------------------------------
 # FLOOD EVENT VIDEO TOGGLE (LOCAL FIRST, HF FALLBACK)
 # -----------------------------------------------------------
@@ -231,21 +924,51 @@ if show_video:
 # -----------------------------------------------------------
 st.subheader("Interactive Map")
 
-try:
-    c = filtered.geometry.unary_union.centroid
-    center = [c.y, c.x]
-except:
-    center = [0, 0]
+# -----------------------------------------------------------
+# MAP PAYLOAD REDUCTION
+# -----------------------------------------------------------
+# Every vertex serialized here ends up in the browser; simplifying and
+# capping the feature count keeps Leaflet responsive on big layers.
+st.sidebar.write("### Map rendering")
+
+simplify_tol = st.sidebar.slider(
+    "Simplify tolerance (deg)", 0.0, 0.01, 0.0, step=0.0005, format="%.4f"
+)
+max_features = st.sidebar.number_input(
+    "Max features on map", min_value=1000, max_value=200_000,
+    value=25_000, step=1000,
+)
+max_vertices = st.sidebar.number_input(
+    "Max vertices per feature (0 = no cap)", min_value=0,
+    max_value=100_000, value=0, step=500,
+)
+
+# Pre-tiled layers sidestep the monolithic GeoJSON payload entirely:
+# the browser fetches only the tiles in view. Tiles have to be built
+# offline (e.g. tippecanoe on the exported GeoJSON) and hosted; when a
+# URL template is given we render it instead of serializing features.
+vector_tiles_url = st.sidebar.text_input(
+    "Vector tiles URL template (optional, {z}/{x}/{y}.pbf)", ""
+)
+if not vector_tiles_url and len(filtered) > 20_000:
+    st.sidebar.info(
+        f"{len(filtered):,} features selected — a monolithic GeoJSON "
+        "payload this size will strain the browser. Consider serving "
+        "pre-built vector tiles and pasting the URL template above."
+    )
+
+clip_to_view = st.sidebar.checkbox("Clip features to current map view", value=False)
+show_centroids = st.sidebar.checkbox("Show feature centroids", value=False)
 
 map_tiles = st.sidebar.selectbox(
     "Base tiles",
     ["OpenStreetMap", "Stamen Terrain", "Stamen Toner", "CartoDB positron"]
 )
 
-m = folium.Map(location=center, zoom_start=8, tiles=map_tiles)
-
-cmap = None
-
+# Choropleth widgets live here so the map key below can see their values
+# before any map work starts; the actual classification happens inside
+# the build block.
+style_key = None
 if is_numeric and len(filtered) > 0:
     st.sidebar.markdown("### Choropleth Options")
 
@@ -262,43 +985,197 @@ if is_numeric and len(filtered) > 0:
          "PuBu_09", "YlGn_09", "GnBu_09"],
         index=0
     )
+    style_key = (method, bins, palette_name)
 
-    values = filtered[chosen_x].astype(float)
-
-    try:
-        if method == "natural_breaks (Jenks)":
-            classifier = mapclassify.NaturalBreaks(values, k=bins)
-        elif method == "quantiles":
-            classifier = mapclassify.Quantiles(values, k=bins)
-        else:
-            classifier = mapclassify.EqualInterval(values, k=bins)
-
-        filtered["_class"] = classifier.yb
-        cmap = getattr(cm.linear, palette_name).scale(values.min(), values.max())
+popup_fields = st.multiselect("Popup fields", columns_no_geom, default=columns_no_geom[:5])
 
-    except:
-        filtered["_class"] = -1
-        cmap = cm.LinearColormap(["#cccccc", "#cccccc"])
+viewport_key = None
+viewport = None
+if clip_to_view and st.session_state.get("map_bounds"):
+    b = st.session_state["map_bounds"]
+    viewport = box(
+        b["_southWest"]["lng"], b["_southWest"]["lat"],
+        b["_northEast"]["lng"], b["_northEast"]["lat"],
+    )
+    viewport_key = tuple(round(v, 6) for v in viewport.bounds)
 
 def style_function(feature):
-    v = feature["properties"].get(chosen_x)
-    if cmap is None or v is None:
+    fill = feature["properties"].get("__fill")
+    if fill is None:
         return {"fillOpacity": 0.3, "color": "black", "weight": 0.3}
-    return {"fillColor": cmap(v), "color": "black", "weight": 0.25, "fillOpacity": 0.85}
+    return {"fillColor": fill, "color": "black", "weight": 0.25, "fillOpacity": 0.85}
+
+# Everything the rendered map depends on. When this key matches the
+# previous rerun the whole build (payload reduction, coloring, folium
+# HTML render) is skipped and the cached HTML is re-embedded — e.g. when
+# only the histogram, table or BCR widgets changed.
+map_key = (
+    gpkg_path, chosen_layer, chosen_x, map_tiles, simplify_tol,
+    max_features, max_vertices, viewport_key, style_key, tuple(popup_fields),
+    vector_tiles_url, show_centroids, len(filtered),
+) + filter_key
+
+rebuild_map = (
+    clip_to_view  # needs a live st_folium widget to report bounds
+    or st.session_state.get("map_key") != map_key
+    or "map_html" not in st.session_state
+)
 
-popup_fields = st.multiselect("Popup fields", columns_no_geom, default=columns_no_geom[:5])
+if rebuild_map:
+    map_gdf = filtered
+    if viewport is not None:
+        # Bounds come from the previous st_folium render; the R-tree
+        # built at load time makes this an O(log N + k) envelope query.
+        # Envelope-only intersection is enough for display clipping, so
+        # skip the exact GEOS predicate test per candidate.
+        hit = np.fromiter(
+            map_gdf.sindex.intersection(viewport.bounds), dtype=np.int64
+        )
+        map_gdf = map_gdf.iloc[np.sort(hit)]
+
+    if len(map_gdf) > max_features:
+        map_gdf = map_gdf.sample(int(max_features), random_state=0)
+    if simplify_tol > 0:
+        map_gdf = map_gdf.set_geometry(
+            gpd.GeoSeries(
+                simplify_geoms(map_gdf.geometry, simplify_tol),
+                index=map_gdf.index, crs=map_gdf.crs,
+            )
+        )
+    if max_vertices and len(map_gdf):
+        map_gdf = map_gdf.set_geometry(
+            gpd.GeoSeries(
+                cap_vertices(map_gdf.geometry, int(max_vertices)),
+                index=map_gdf.index, crs=map_gdf.crs,
+            )
+        )
 
-folium.GeoJson(
-    filtered.to_json(),
-    style_function=style_function,
-    tooltip=folium.GeoJsonTooltip(fields=popup_fields),
-    popup=folium.GeoJsonPopup(fields=popup_fields, labels=True),
-).add_to(m)
+    # Quantize display coordinates to a 1e-5 degree grid (~1 m). Full
+    # float64 precision never survives pixel rasterization at dashboard
+    # zooms; it only inflates the serialized payload. Downloads keep the
+    # untouched geometries.
+    if len(map_gdf):
+        map_gdf = map_gdf.set_geometry(map_gdf.geometry.set_precision(1e-5))
 
-if cmap:
-    cmap.add_to(m)
+    # Center on the bounding-box midpoint: total_bounds only touches the
+    # envelope floats in C, while unioning every polygon just to find a
+    # starting viewport is O(N log N) in GEOS.
+    center = [0, 0]
+    if len(filtered):
+        try:
+            minx, miny, maxx, maxy = filtered.total_bounds
+            if np.isfinite([minx, miny, maxx, maxy]).all():
+                center = [(miny + maxy) / 2, (minx + maxx) / 2]
+        except Exception:
+            pass
+
+    # prefer_canvas renders vectors onto a single canvas instead of one
+    # SVG DOM node per feature, which is what freezes the tab past a few
+    # thousand features.
+    m = folium.Map(location=center, zoom_start=8, tiles=map_tiles,
+                   prefer_canvas=True)
+
+    cmap = None
+    if style_key is not None:
+        # One float array for the whole block — no intermediate
+        # astype(float) Series copy.
+        vals_arr = pd.to_numeric(
+            filtered[chosen_x], errors="coerce"
+        ).to_numpy(dtype=float)
+        try:
+            vmin = float(np.nanmin(vals_arr))
+            vmax = float(np.nanmax(vals_arr))
+            edges = fit_classifier_bins(
+                hashlib.blake2b(vals_arr.tobytes()).hexdigest(),
+                method, bins, vals_arr,
+            )
+
+            # Step the colormap on the classifier's edges so the legend
+            # and the fills both reflect the chosen method/bins.
+            cmap = (
+                getattr(cm.linear, palette_name)
+                .scale(vmin, vmax)
+                .to_step(index=[vmin] + edges.tolist())
+            )
+
+            # Precompute one fill color per feature: k cmap calls at the
+            # class midpoints, then a vectorized searchsorted + take.
+            # Without this folium calls style_function -> cmap(v) once
+            # per feature while walking the GeoJSON in Python.
+            mids = (np.concatenate([[vmin], edges[:-1]]) + edges) / 2
+            palette = np.array([cmap(v) for v in mids])
+
+            arr = pd.to_numeric(
+                map_gdf[chosen_x], errors="coerce"
+            ).to_numpy(dtype=float)
+            cls = np.clip(
+                np.searchsorted(
+                    edges, np.nan_to_num(arr, nan=vmin), side="left"
+                ),
+                0, len(edges) - 1,
+            )
+            map_gdf = map_gdf.assign(
+                __fill=np.where(np.isnan(arr), "#cccccc", palette[cls])
+            )
+
+        except:
+            cmap = cm.LinearColormap(["#cccccc", "#cccccc"])
+
+    if vector_tiles_url:
+        folium.plugins.VectorGridProtobuf(vector_tiles_url, "vector tiles").add_to(m)
+    else:
+        if popup_fields:
+            map_gdf = map_gdf.assign(
+                __popup=popup_html_column(map_gdf, popup_fields)
+            )
+
+        geojson_data = filtered_geojson(
+            map_gdf,
+            # chosen_x itself stays out of the payload: the client only
+            # sees its precomputed __fill color unless it is also a
+            # popup field.
+            tuple(dict.fromkeys(popup_fields + ["__fill", "__popup"])),
+            (gpkg_path, chosen_layer, simplify_tol, max_features,
+             max_vertices, viewport_key, style_key) + filter_key,
+        )
 
-st_folium(m, height=600, width=1000)
+        popup = (
+            folium.GeoJsonPopup(fields=["__popup"], labels=False)
+            if popup_fields else None
+        )
+        folium.GeoJson(
+            geojson_data,
+            style_function=style_function,
+            tooltip=folium.GeoJsonTooltip(fields=popup_fields),
+            popup=popup,
+        ).add_to(m)
+
+    if show_centroids and len(map_gdf) > 0:
+        # One vectorized GEOS centroid call and a single clustered layer
+        # — never one CircleMarker DOM node per row.
+        cent = map_gdf.geometry.centroid
+        folium.plugins.FastMarkerCluster(
+            list(zip(cent.y.to_numpy(), cent.x.to_numpy()))
+        ).add_to(m)
+
+    if cmap:
+        cmap.add_to(m)
+
+    if clip_to_view:
+        map_state = st_folium(m, height=600, width=1000,
+                              returned_objects=["bounds"])
+        if map_state and map_state.get("bounds", {}).get("_southWest"):
+            st.session_state["map_bounds"] = map_state["bounds"]
+        # Invalidate the static cache so leaving clip mode rebuilds.
+        st.session_state.pop("map_key", None)
+        st.session_state.pop("map_html", None)
+    else:
+        html = m.get_root().render()
+        st.session_state["map_key"] = map_key
+        st.session_state["map_html"] = html
+        components.html(html, height=600)
+else:
+    components.html(st.session_state["map_html"], height=600)
 
 # -----------------------------------------------------------
 # STATS & CHARTS
@@ -307,32 +1184,73 @@ st.subheader("Statistics & Charts")
 colA, colB = st.columns(2)
 
 with colA:
-    st.dataframe(filtered.head(10))
+    # Attributes only: rendering geometry cells means stringifying
+    # whole multipolygons to WKT, and ten of those can outweigh every
+    # other element on the page.
+    st.dataframe(filtered.head(10).drop(columns=[filtered.geometry.name]))
 
 with colB:
-    st.write(filtered.describe(include="all"))
+    # Describe only columns the user asked about, computed once per
+    # (filter state, column set) — the old describe(include="all")
+    # walked every attribute column on every rerun.
+    describe_cols = st.multiselect(
+        "Describe columns", columns_no_geom, default=[chosen_x]
+    )
+    if describe_cols:
+        num_summary, cat_summary = column_summaries(
+            filtered,
+            tuple(describe_cols),
+            (gpkg_path, chosen_layer) + filter_key,
+        )
+        if num_summary is not None:
+            st.write(num_summary)
+        if cat_summary is not None:
+            st.dataframe(cat_summary)
 
 if is_numeric:
-    fig, ax = plt.subplots()
-    filtered[chosen_x].plot.hist(ax=ax, bins=30)
-    ax.set_title(f"Histogram of {chosen_x}")
-    st.pyplot(fig)
+    # np.histogram + the native bar chart renders client-side via
+    # Vega-Lite; no matplotlib Figure/Agg/PNG round-trip per rerun.
+    hist_series = histogram_counts(
+        filtered, chosen_x, 30, (gpkg_path, chosen_layer) + filter_key
+    )
+    if hist_series is not None:
+        st.write(f"Histogram of {chosen_x}")
+        st.bar_chart(hist_series)
 
 # -----------------------------------------------------------
 # DOWNLOAD
 # -----------------------------------------------------------
 st.subheader("Download filtered data")
-buffer = io.BytesIO()
-filtered.to_file(buffer, driver="GeoJSON")
-buffer.seek(0)
-
-st.download_button(
-    "Download filtered.geojson",
-    buffer,
-    "filtered.geojson",
-    "application/geo+json",
+
+dl_format = st.selectbox(
+    "Download format", ["GeoJSON", "GeoParquet", "FlatGeobuf"]
 )
 
+# The binary formats avoid per-feature JSON string encoding entirely:
+# GeoParquet keeps the columnar Arrow layout, FlatGeobuf is a compact
+# row format with a built-in spatial index.
+if dl_format == "GeoParquet":
+    dl_name, dl_mime = "filtered.parquet", "application/octet-stream"
+elif dl_format == "FlatGeobuf":
+    dl_name, dl_mime = "filtered.fgb", "application/octet-stream"
+else:
+    dl_name, dl_mime = "filtered.geojson", "application/geo+json"
+
+# Serialize only on request: without the gate the full filtered frame
+# was written out on every rerun just in case someone clicked download.
+dl_key = (gpkg_path, chosen_layer, dl_format) + filter_key
+if st.button("Prepare download") or st.session_state.get("dl_key") == dl_key:
+    st.session_state["dl_key"] = dl_key
+    dl_data = download_bytes(
+        filtered, dl_format, (gpkg_path, chosen_layer) + filter_key
+    )
+    st.download_button(
+        f"Download {dl_name}",
+        dl_data,
+        dl_name,
+        dl_mime,
+    )
+
 st.success("Dashboard ready. Adjust filters in the sidebar to explore the data.")
 
 # -----------------------------------------------------------
@@ -342,27 +1260,33 @@ import plotly.graph_objects as go
 
 st.markdown("## Benefit–Cost Ratio (BCR) Calculator")
 
-# Load BCR.csv from HuggingFace
-BCR_URL = "https://huggingface.co/datasets/trategos/flood-gpkg-datasets/resolve/main/BCR.csv"
-
+# BCR.csv is prefetched in the background at script start; load_bcr
+# either consumes that future or serves the hourly cache.
 try:
-    bcr_df = pd.read_csv(BCR_URL, sep=";")
+    bcr_df = load_bcr(BCR_URL)
 except Exception as e:
     st.error(f"Failed to load BCR.csv from HuggingFace: {e}")
     st.stop()
 
 # Identify scenario key to match with CSV
-scenario_key = extract_scenario_name(gpkg_path)
+scenario_key = SCENARIO_KEYS.get(gpkg_path) or extract_scenario_name(gpkg_path)
 
-matched = bcr_df[bcr_df["Skenario"]
-                 .str.contains(scenario_key, case=False, na=False)]
+# Exact hash lookup on the normalized index first; the substring scan
+# only runs for rows whose Skenario carries extra text around the name.
+lookup_key = scenario_key.lower().strip()
+if lookup_key in bcr_df.index:
+    matched = bcr_df.loc[[lookup_key]]
+else:
+    matched = bcr_df[bcr_df["Skenario"]
+                     .str.contains(scenario_key, case=False, na=False)]
 
 if matched.empty:
     st.warning(f"No BCR record found for: {scenario_key}")
 else:
     row = matched.iloc[0]
 
-    # Convert Rp text → number
+    # Convert Rp text → number (user CAPEX input only; the CSV benefit
+    # column is parsed vectorized at load time)
     def parse_rupiah(x):
         if isinstance(x, str):
             x = x.replace("Rp", "").replace(".", "").replace(",", "").strip()
@@ -371,8 +1295,8 @@ else:
         except:
             return None
 
-    # Extract from CSV
-    benefit = parse_rupiah(row["Benefit"])
+    # Extract from CSV (pre-parsed numeric column)
+    benefit = row["Benefit_num"]
     baseline_bcr = float(row["Nilai BCR"])   # CSV already includes BCR
     base_cost = benefit / baseline_bcr  # Derive cost
 